@@ -2,9 +2,9 @@
 import os
 import time
 import json
-import csv
 import threading
 import subprocess
+import tempfile
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
@@ -24,13 +24,101 @@ def raw_to_voltage(raw):
     """
     return (raw / ADC_MAX) * Vref
 
+# --------------------------------------------------------------------
+# Buffer de grabación
+# --------------------------------------------------------------------
+CSV_HEADER = ["timestamp", "C1", "C2", "C3", "C4", "F1", "F2", "F3"]
+RECORD_DTYPE = np.dtype([
+    ("timestamp", np.float64),
+    ("C1", np.int32), ("C2", np.int32), ("C3", np.int32), ("C4", np.int32),
+    ("F1", np.int8), ("F2", np.int8), ("F3", np.int8),
+])
+RECORD_FMT = ["%.6f", "%d", "%d", "%d", "%d", "%d", "%d", "%d"]
+
+class RecordingBuffer:
+    """
+    Almacena las muestras grabadas en bloques de tamaño fijo (arrays numpy con
+    RECORD_DTYPE, 27 bytes por muestra). Cuando los bloques completos superan
+    max_memory_bytes se vuelcan a un archivo temporal, de modo que la duración
+    de la grabación no está limitada por la memoria disponible.
+    """
+
+    def __init__(self, chunk_size=4096, max_memory_bytes=8 * 1024 * 1024):
+        self.chunk_size = chunk_size
+        self.max_memory_bytes = max_memory_bytes
+        self._chunks = []          # Bloques completos en memoria
+        self._current = np.empty(chunk_size, dtype=RECORD_DTYPE)
+        self._pos = 0              # Posición libre en el bloque actual
+        self._spill = None         # Archivo temporal con los bloques volcados
+        self._spilled_chunks = 0
+
+    def __len__(self):
+        return ((self._spilled_chunks + len(self._chunks)) * self.chunk_size
+                + self._pos)
+
+    def append(self, row):
+        """
+        Añade una muestra (timestamp, C1, C2, C3, C4, F1, F2, F3).
+        """
+        self._current[self._pos] = row
+        self._pos += 1
+        if self._pos == self.chunk_size:
+            self._chunks.append(self._current)
+            self._current = np.empty(self.chunk_size, dtype=RECORD_DTYPE)
+            self._pos = 0
+            if len(self._chunks) * self._current.nbytes > self.max_memory_bytes:
+                self._spill_to_disk()
+
+    def _spill_to_disk(self):
+        """
+        Vuelca los bloques completos en memoria al archivo temporal.
+        """
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile(prefix="grafico9-")
+        for chunk in self._chunks:
+            self._spill.write(chunk.tobytes())
+        self._spilled_chunks += len(self._chunks)
+        self._chunks = []
+
+    def iter_chunks(self):
+        """
+        Devuelve los bloques grabados en orden: primero los volcados a disco,
+        después los que siguen en memoria y por último el bloque parcial.
+        """
+        if self._spill is not None:
+            self._spill.flush()
+            self._spill.seek(0)
+            nbytes = self.chunk_size * RECORD_DTYPE.itemsize
+            for _ in range(self._spilled_chunks):
+                yield np.frombuffer(self._spill.read(nbytes), dtype=RECORD_DTYPE)
+        yield from self._chunks
+        if self._pos:
+            yield self._current[:self._pos]
+
+    def write_csv(self, file):
+        """
+        Escribe todas las muestras en un archivo CSV ya abierto, bloque a bloque.
+        """
+        file.write(",".join(CSV_HEADER) + "\n")
+        for chunk in self.iter_chunks():
+            np.savetxt(file, chunk, fmt=RECORD_FMT, delimiter=",")
+
+    def close(self):
+        """
+        Libera el archivo temporal, si se llegó a crear.
+        """
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
 # --------------------------------------------------------------------
 # Variables globales
 # --------------------------------------------------------------------
 live_data = []         # Lista de datos para la gráfica (timestamp, C1, C2, C3, C4)
 marker_events = []     # Lista de eventos de fotointerruptores (timestamp, sensor, estado)
-recorded_data = []     # Lista de datos completos grabados (timestamp, C1, C2, C3, C4, F1, F2, F3)
+recorded_data = RecordingBuffer()  # Datos completos grabados (timestamp, C1, C2, C3, C4, F1, F2, F3)
 recording = False      # Indicador de grabación activa
+recording_lock = threading.Lock()  # Protege recording y recorded_data entre el hilo MQTT y el Timer
 graph_window = 10      # Ventana de tiempo para la gráfica (en segundos)
 
 # --------------------------------------------------------------------
@@ -79,17 +167,18 @@ def on_message(client, userdata, msg):
     marker_events[:] = [m for m in marker_events if m[0] >= cutoff]
 
     # Si se está grabando, guardar los datos completos en recorded_data
-    if recording:
-        recorded_data.append((
-            t_unix,
-            data['C1'],
-            data['C2'],
-            data['C3'],
-            data['C4'],
-            int(data.get("F1", False)),
-            int(data.get("F2", False)),
-            int(data.get("F3", False))
-        ))
+    with recording_lock:
+        if recording:
+            recorded_data.append((
+                t_unix,
+                data['C1'],
+                data['C2'],
+                data['C3'],
+                data['C4'],
+                int(data.get("F1", False)),
+                int(data.get("F2", False)),
+                int(data.get("F3", False))
+            ))
 
 # Configurar el cliente MQTT
 client = mqtt.Client()
@@ -101,14 +190,14 @@ client.loop_start()
 # --------------------------------------------------------------------
 # Funciones para grabar y guardar datos
 # --------------------------------------------------------------------
-def save_csv_data():
+def save_csv_data(buffer):
     """
-    Guarda los datos grabados en un archivo CSV.
+    Guarda los datos grabados (un RecordingBuffer) en un archivo CSV.
     El nombre del archivo tendrá el formato:
       YYYYMMDD-DatosRaw-EnsayoX.csv
     donde YYYYMMDD es la fecha actual y X es el número de ensayo incremental.
     """
-    if recorded_data:
+    if len(buffer):
         # Obtener la fecha actual en formato YYYYMMDD
         now = datetime.now()
         date_str = now.strftime("%Y%m%d")
@@ -127,10 +216,7 @@ def save_csv_data():
 
         # Guardar los datos en el archivo CSV
         with open(filename, "w", newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(["timestamp", "C1", "C2", "C3", "C4", "F1", "F2", "F3"])
-            for entry in recorded_data:
-                writer.writerow(entry)
+            buffer.write_csv(file)
         print(f"[INFO] CSV guardado en {filename}")
         ejecutar_script_resistencias(filename)
         status_text.set_text("Grabación finalizada")
@@ -154,21 +240,30 @@ def start_recording(duration):
     Inicia la grabación de datos durante un periodo determinado (en segundos).
     """
     global recording, recorded_data
-    if not recording:
-        print(f"[INFO] Grabando {duration} s...")
+    with recording_lock:
+        if recording:
+            return
+        recorded_data = RecordingBuffer()  # Reinicia los datos grabados
         recording = True
-        recorded_data = []  # Reinicia los datos grabados
-        status_text.set_text("Grabando...")
-        threading.Timer(duration, stop_recording).start()
+    print(f"[INFO] Grabando {duration} s...")
+    status_text.set_text("Grabando...")
+    threading.Timer(duration, stop_recording).start()
 
 def stop_recording():
     """
     Detiene la grabación de datos y guarda el archivo CSV.
+    El buffer se entrega bajo el lock, así ninguna muestra queda a medio añadir.
     """
-    global recording
-    recording = False
+    global recording, recorded_data
+    with recording_lock:
+        recording = False
+        buffer = recorded_data
+        recorded_data = RecordingBuffer()
     print("[INFO] Grabación finalizada. Guardando...")
-    save_csv_data()
+    try:
+        save_csv_data(buffer)
+    finally:
+        buffer.close()
 
 # --------------------------------------------------------------------
 # Configuración del gráfico en tiempo real